@@ -7,21 +7,30 @@ Ce script prend une vidéo en entrée et génère automatiquement :
   - Un config.json pré-rempli
 
 Prérequis :
-  pip install openai-whisper
+  pip install "faster-whisper>=1.1"   (recommandé : décodage par lots, bien plus rapide)
+  ou : pip install openai-whisper
 
 Usage :
   python generate_subtitles.py videos/ma-chanson/video.mp4
   python generate_subtitles.py videos/ma-chanson/video.mp4 --language fr --model medium
   python generate_subtitles.py videos/ma-chanson/  # détecte auto la vidéo
+  python generate_subtitles.py videos/*/           # plusieurs chansons, modèle chargé une fois
+  python generate_subtitles.py videos/ma-chanson/ --model models/whisper-base-int8
+      # modèle CTranslate2 converti avec :
+      # ct2-transformers-converter --model openai/whisper-base --quantization int8 --output_dir models/whisper-base-int8
+
+L'audio décodé est gardé à côté de la vidéo (<vidéo>.audio.npz) : relancer
+avec une autre langue ou un autre modèle évite de redécoder la vidéo.
 """
 
 import argparse
 import json
 import os
 import sys
+import threading
 from pathlib import Path
 
-VIDEO_EXTENSIONS = {".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg", ".wav", ".mp3", ".flac"}
+VIDEO_EXTENSIONS = frozenset({".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg", ".wav", ".mp3", ".flac"})
 
 
 def find_video(path):
@@ -36,35 +45,152 @@ def find_video(path):
     return None
 
 
-def generate_subtitles(video_path, language="fr", model_name="base"):
-    """Génère les sous-titres avec Whisper."""
+# Nombre de segments audio décodés en parallèle par faster-whisper
+BATCH_SIZE = 16
+
+# Modèles Whisper déjà chargés, réutilisés entre les appels à generate_subtitles()
+# { (model_name, compute_type): (backend, model) }
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_name="base", compute_type="auto"):
+    """Charge un modèle Whisper une seule fois par processus.
+
+    Retourne (backend, model) où backend vaut "faster-whisper" ou "whisper".
+    compute_type n'est utilisé que par faster-whisper ("auto" = int8 quantifié).
+    """
+    with _models_lock:
+        entry = _models.get((model_name, compute_type))
+        if entry is None:
+            entry = _load_model(model_name, compute_type)
+            _models[(model_name, compute_type)] = entry
+        return entry
+
+
+def default_compute_type():
+    """int8 sur CPU, int8_float16 si un GPU CUDA est disponible."""
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "int8_float16"
+    except Exception:
+        pass
+    return "int8"
+
+
+def _load_model(model_name, compute_type):
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        pass
+    else:
+        if compute_type == "auto":
+            compute_type = default_compute_type()
+        print(f"🎤 Chargement du modèle Whisper ({model_name}, faster-whisper {compute_type})...")
+        model = WhisperModel(model_name, device="auto", compute_type=compute_type)
+        pipeline = batched_pipeline_class()
+        if pipeline is None:
+            print("   ⚠️  faster-whisper < 1.1 : pas de décodage par lots (pip install -U faster-whisper)")
+            return "faster-whisper", model
+        return "faster-whisper", pipeline(model=model)
+
     try:
         import whisper
     except ImportError:
         print("❌ Whisper n'est pas installé.")
-        print("   Installez-le avec : pip install openai-whisper")
+        print("   Installez-le avec : pip install faster-whisper")
+        print("   (ou : pip install openai-whisper)")
         sys.exit(1)
 
+    print(f"🎤 Chargement du modèle Whisper ({model_name})...")
+    return "whisper", whisper.load_model(model_name)
+
+
+def batched_pipeline_class():
+    """BatchedInferencePipeline, ou None si faster-whisper est antérieur à 1.1."""
+    try:
+        from faster_whisper import BatchedInferencePipeline
+    except ImportError:
+        return None
+    return BatchedInferencePipeline
+
+
+def load_audio(backend, video_path, use_cache=True):
+    """Décode l'audio de la vidéo (16 kHz mono float32).
+
+    Le résultat est mis en cache dans <vidéo>.audio.npz, valable tant que la
+    taille et la date de modification de la vidéo ne changent pas.
+    """
+    import numpy as np
+
+    cache_path = video_path.with_name(video_path.name + ".audio.npz")
+    st = video_path.stat()
+    key = f"{st.st_size}:{st.st_mtime_ns}"
+
+    if use_cache and cache_path.exists():
+        try:
+            with np.load(cache_path) as cached:
+                if str(cached["key"]) == key:
+                    print("   Audio déjà décodé (cache)")
+                    return cached["audio"]
+        except Exception:
+            pass
+
+    if backend == "faster-whisper":
+        from faster_whisper import decode_audio
+        audio = decode_audio(str(video_path), sampling_rate=16000)
+    else:
+        import whisper
+        audio = whisper.load_audio(str(video_path))
+
+    if use_cache:
+        try:
+            with open(cache_path, "wb") as f:
+                np.savez(f, audio=audio, key=np.array(key))
+        except OSError as e:
+            print(f"   ⚠️  Cache audio non écrit : {e}")
+    return audio
+
+
+def transcribe(backend, model, audio, language):
+    """Transcrit l'audio et retourne une liste de segments {start, end, text}."""
+    if backend == "faster-whisper":
+        pipeline = batched_pipeline_class()
+        if pipeline is not None and isinstance(model, pipeline):
+            # Découpage VAD en morceaux de 30 s max, décodés par lots ; les
+            # timestamps sont ramenés sur la timeline d'origine par le pipeline.
+            segments, _info = model.transcribe(audio, language=language, batch_size=BATCH_SIZE)
+        else:
+            segments, _info = model.transcribe(audio, language=language)
+        return [{"start": seg.start, "end": seg.end, "text": seg.text} for seg in segments]
+
+    result = model.transcribe(audio, language=language)
+    return result.get("segments", [])
+
+
+def generate_subtitles(video_path, language="fr", model_name="base", compute_type="auto",
+                       audio_cache=True):
+    """Génère les sous-titres avec Whisper."""
     video_path = Path(video_path)
     output_dir = video_path.parent
 
-    print(f"🎤 Chargement du modèle Whisper ({model_name})...")
-    model = whisper.load_model(model_name)
+    backend, model = load_model(model_name, compute_type)
 
     print(f"🎵 Transcription de : {video_path.name}")
     print(f"   Langue : {language}")
-    result = model.transcribe(str(video_path), language=language)
+    audio = load_audio(backend, video_path, use_cache=audio_cache)
+    segments = transcribe(backend, model, audio, language)
 
     # Générer le SRT
     srt_path = output_dir / "subtitles.srt"
-    segments = result.get("segments", [])
 
+    srt = "".join(
+        f"{i}\n{format_srt_time(seg['start'])} --> {format_srt_time(seg['end'])}\n{seg['text'].strip()}\n\n"
+        for i, seg in enumerate(segments, 1)
+    )
     with open(srt_path, "w", encoding="utf-8") as f:
-        for i, seg in enumerate(segments, 1):
-            start = format_srt_time(seg["start"])
-            end = format_srt_time(seg["end"])
-            text = seg["text"].strip()
-            f.write(f"{i}\n{start} --> {end}\n{text}\n\n")
+        f.write(srt)
 
     print(f"✅ Sous-titres générés : {srt_path}")
     print(f"   {len(segments)} segments trouvés")
@@ -106,11 +232,10 @@ def generate_subtitles(video_path, language="fr", model_name="base"):
 
 def format_srt_time(seconds):
     """Convertit des secondes en format SRT (HH:MM:SS,mmm)."""
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    ms = int((seconds % 1) * 1000)
-    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+    h, rem = divmod(int(seconds * 1000), 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    return "%02d:%02d:%02d,%03d" % (h, m, s, ms)
 
 
 def format_readable_time(seconds):
@@ -122,21 +247,45 @@ def format_readable_time(seconds):
 
 def main():
     parser = argparse.ArgumentParser(description="Générer des sous-titres avec Whisper")
-    parser.add_argument("path", help="Chemin vers la vidéo ou son dossier")
+    parser.add_argument("paths", nargs="+", metavar="path",
+                        help="Chemin(s) vers la vidéo ou son dossier")
     parser.add_argument("--language", "-l", default="fr", help="Langue (défaut: fr)")
     parser.add_argument(
         "--model", "-m", default="base",
-        help="Modèle Whisper: tiny, base, small, medium, large (défaut: base)"
+        help="Modèle Whisper: tiny, base, small, medium, large (défaut: base), "
+             "ou dossier d'un modèle CTranslate2 converti"
+    )
+    parser.add_argument(
+        "--compute-type", default="auto",
+        help="Précision faster-whisper: int8, int8_float16, float16, float32 "
+             "(défaut: auto = int8 sur CPU, int8_float16 sur GPU)"
+    )
+    parser.add_argument(
+        "--no-audio-cache", action="store_true",
+        help="Ne pas lire/écrire le cache de l'audio décodé (<vidéo>.audio.npz)"
     )
     args = parser.parse_args()
 
-    video = find_video(args.path)
-    if not video:
-        print(f"❌ Aucune vidéo trouvée dans : {args.path}")
-        print(f"   Extensions supportées : {', '.join(sorted(VIDEO_EXTENSIONS))}")
+    videos = []
+    for path in args.paths:
+        video = find_video(path)
+        if not video:
+            print(f"❌ Aucune vidéo trouvée dans : {path}")
+            print(f"   Extensions supportées : {', '.join(sorted(VIDEO_EXTENSIONS))}")
+            if len(args.paths) == 1:
+                sys.exit(1)
+            continue
+        videos.append(video)
+
+    if not videos:
         sys.exit(1)
 
-    generate_subtitles(video, language=args.language, model_name=args.model)
+    # Le modèle est chargé au premier appel puis réutilisé pour les suivants
+    for i, video in enumerate(videos, 1):
+        if len(videos) > 1:
+            print(f"━━━ [{i}/{len(videos)}] {video.parent.name} ━━━")
+        generate_subtitles(video, language=args.language, model_name=args.model,
+                           compute_type=args.compute_type, audio_cache=not args.no_audio_cache)
 
 
 if __name__ == "__main__":
@@ -24,6 +24,8 @@ Variables optionnelles :
   VIDEOS_DIR           - Dossier local des vidéos (défaut: ./videos)
 """
 
+import gzip
+import hashlib
 import http.server
 import json
 import os
@@ -31,11 +33,17 @@ import re
 import sys
 import random
 import mimetypes
+import stat
 import urllib.parse
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from io import BytesIO
+
+try:
+    import orjson  # optionnel : sérialisation JSON 3 à 10× plus rapide
+except ImportError:
+    orjson = None
 
 # ============================================================
 # CONFIG
@@ -52,46 +60,93 @@ R2_PUBLIC_URL = os.environ.get("R2_PUBLIC_URL", "")  # URL publique pour les vid
 
 IS_CLOUD = bool(R2_BUCKET_NAME)
 
+# Nombre de dossiers R2 traités en parallèle pendant un scan
+R2_SCAN_WORKERS = 32
+
+# Taille des blocs quand une vidéo locale ne peut pas être envoyée par sendfile
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# En-tête Range des requêtes vidéo ("bytes=début-[fin]")
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
 # ============================================================
 # SRT PARSER
 # ============================================================
-def parse_srt(content):
-    """Parse du contenu SRT (string) et retourne une liste de cues."""
-    cues = []
-    blocks = re.split(r"\n\s*\n", content.strip())
-
-    for block in blocks:
-        lines = block.strip().split("\n")
-        if len(lines) < 2:
+def parse_srt_timestamp(ts):
+    """Convertit "HH:MM:SS,mmm" (ou "H:MM:SS.mmm") en millisecondes, None si invalide."""
+    if len(ts) < 11 or ts[-4] not in ",.":
+        return None
+    parts = ts[:-4].split(":")
+    if len(parts) != 3:
+        return None
+    h, m, s = parts
+    ms = ts[-3:]
+    if not (0 < len(h) <= 2 and len(m) == 2 and len(s) == 2
+            and h.isdecimal() and m.isdecimal() and s.isdecimal() and ms.isdecimal()):
+        return None
+    return int(h) * 3600000 + int(m) * 60000 + int(s) * 1000 + int(ms)
+
+
+def strip_tags(text):
+    """Retire les balises <...> (italique, couleur...) d'une ligne de sous-titre."""
+    if "<" not in text:
+        return text
+    parts = []
+    pos = 0
+    while True:
+        lt = text.find("<", pos)
+        if lt < 0:
+            break
+        gt = text.find(">", lt + 1)
+        if gt < 0:
+            break
+        if gt == lt + 1:
+            # "<>" n'est pas une balise : on garde le "<" et on continue
+            parts.append(text[pos:lt + 1])
+            pos = lt + 1
             continue
+        parts.append(text[pos:lt])
+        pos = gt + 1
+    parts.append(text[pos:])
+    return "".join(parts)
 
-        timestamp_line = None
-        text_lines = []
-        for i, line in enumerate(lines):
-            if "-->" in line:
-                timestamp_line = line
-                text_lines = lines[i + 1:]
-                break
 
-        if not timestamp_line:
-            continue
+# États du parseur SRT
+_EXPECT_TIME = 0   # numéro du cue (ignoré) puis ligne "début --> fin"
+_TEXT = 1          # lignes de texte jusqu'à la prochaine ligne vide
+_SKIP = 2          # timestamp invalide : on ignore le bloc
 
-        match = re.match(
-            r"(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})",
-            timestamp_line.strip(),
-        )
-        if not match:
-            continue
 
-        g = match.groups()
-        start = int(g[0]) * 3600 + int(g[1]) * 60 + int(g[2]) + int(g[3]) / 1000
-        end = int(g[4]) * 3600 + int(g[5]) * 60 + int(g[6]) + int(g[7]) / 1000
+def parse_srt(content):
+    """Parse du contenu SRT (string) et retourne une liste de cues.
 
-        text = " ".join(text_lines)
-        text = re.sub(r"<[^>]+>", "", text).strip()
+    Parseur ligne à ligne (sans regex) : les blocs sont séparés par des
+    lignes vides, le texte d'un bloc suit sa première ligne contenant "-->".
+    """
+    cues = []
+    state = _EXPECT_TIME
+    start = end = 0
+    text_lines = []
+
+    # Ligne vide finale pour terminer le dernier bloc
+    for line in content.splitlines() + [""]:
+        if not line or line.isspace():
+            if state == _TEXT:
+                text = strip_tags(" ".join(text_lines)).strip()
+                if text:
+                    cues.append({"start": start / 1000, "end": end / 1000, "text": text})
+                text_lines = []
+            state = _EXPECT_TIME
+            continue
 
-        if text:
-            cues.append({"start": round(start, 3), "end": round(end, 3), "text": text})
+        if state == _TEXT:
+            text_lines.append(line)
+        elif state == _EXPECT_TIME and "-->" in line:
+            left, _, right = line.partition("-->")
+            right = right.split(None, 1)
+            start = parse_srt_timestamp(left.strip())
+            end = parse_srt_timestamp(right[0]) if right else None
+            state = _SKIP if start is None or end is None else _TEXT
 
     return cues
 
@@ -128,59 +183,113 @@ def init_r2():
         endpoint_url=endpoint,
         aws_access_key_id=R2_ACCESS_KEY_ID,
         aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version="s3v4"),
+        config=Config(signature_version="s3v4", max_pool_connections=2 * R2_SCAN_WORKERS),
         region_name="auto",
     )
     print(f"  ☁️  Connecté à R2 : {R2_BUCKET_NAME}")
 
 
-def r2_list_folders():
-    """Liste les 'dossiers' (préfixes) dans le bucket R2."""
-    folders = set()
+def r2_list_library():
+    """Liste tout le bucket en une seule pagination.
+
+    Retourne { dossier: { nom_fichier: etag } }, dossiers triés.
+    """
+    folders = {}
     paginator = s3_client.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=R2_BUCKET_NAME, Delimiter="/"):
-        for prefix in page.get("CommonPrefixes", []):
-            folder = prefix["Prefix"].rstrip("/")
-            if not folder.startswith("_"):
-                folders.add(folder)
-    return sorted(folders)
+    for page in paginator.paginate(Bucket=R2_BUCKET_NAME):
+        for obj in page.get("Contents", []):
+            folder, _, name = obj["Key"].partition("/")
+            if name and not folder.startswith("_"):
+                folders.setdefault(folder, {})[name] = obj["ETag"]
+    return dict(sorted(folders.items()))
 
 
-def r2_get_text(key):
-    """Récupère un fichier texte depuis R2."""
+# Fichiers R2 déjà parsés : { key: (etag, résultat) }
+_r2_cache = {}
+
+
+def r2_get_parsed(key, parse, etag=None):
+    """Récupère un fichier texte R2 et retourne parse(texte), ou None s'il n'existe pas.
+
+    Le résultat est mis en cache par ETag : si l'ETag connu (donné par le
+    listing) n'a pas changé, aucune requête n'est faite ; sinon R2 répond
+    304 quand le fichier est identique et on réutilise le résultat.
+    """
+    cached = _r2_cache.get(key)
+    if cached and etag and cached[0] == etag:
+        return cached[1]
+    extra = {"IfNoneMatch": cached[0]} if cached else {}
     try:
-        response = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=key)
-        return response["Body"].read().decode("utf-8")
-    except Exception:
+        response = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=key, **extra)
+    except Exception as e:
+        status = getattr(e, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if cached and status == 304:
+            return cached[1]
         return None
 
-
-def r2_file_exists(key):
-    """Vérifie si un fichier existe dans R2."""
     try:
-        s3_client.head_object(Bucket=R2_BUCKET_NAME, Key=key)
-        return True
+        data = response["Body"].read()
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            # Même repli que parse_srt_file pour les SRT locaux
+            text = data.decode("latin-1")
+        result = parse(text)
     except Exception:
-        return False
+        # Lecture interrompue ou fichier illisible : on saute juste cette
+        # chanson (signalée par le thread principal), sans rien mettre en cache
+        return None
 
-
-def r2_find_video(folder):
-    """Trouve un fichier vidéo dans un dossier R2."""
-    video_exts = {".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg"}
-    paginator = s3_client.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=R2_BUCKET_NAME, Prefix=f"{folder}/"):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            ext = os.path.splitext(key)[1].lower()
-            if ext in video_exts:
-                return key
-    return None
+    _r2_cache[key] = (response["ETag"], result)
+    return result
 
 
 # ============================================================
 # LIBRARY SCANNER
 # ============================================================
-VIDEO_EXTENSIONS = {".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg"}
+VIDEO_EXTENSIONS = frozenset({".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg"})
+
+# Extension → type MIME des fichiers servis en local (complété au fil des requêtes)
+mimetypes.init()
+MIME_TYPES = {ext: mimetypes.types_map.get(ext, "application/octet-stream") for ext in VIDEO_EXTENSIONS}
+
+# Fichiers locaux déjà parsés : { path: (mtime_ns, résultat) }
+_srt_cache = {}
+_config_cache = {}
+
+
+def parse_config(text):
+    """Parse un config.json, {} s'il est invalide."""
+    try:
+        return json.loads(text)
+    except Exception:
+        return {}
+
+
+def load_config_file(filepath):
+    """Charge un config.json depuis le disque, {} s'il est illisible."""
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return parse_config(f.read())
+    except Exception:
+        return {}
+
+
+def load_cached(filepath, mtime, cache, loader):
+    """Retourne loader(filepath), réutilisé tant que le mtime du fichier ne change pas."""
+    cached = cache.get(filepath)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    result = loader(filepath)
+    cache[filepath] = (mtime, result)
+    return result
+
+
+def clear_scan_caches():
+    """Oublie les SRT/configs déjà parsés (prochain scan complet)."""
+    _srt_cache.clear()
+    _config_cache.clear()
+    _r2_cache.clear()
 
 
 def scan_library_local(videos_dir):
@@ -192,38 +301,40 @@ def scan_library_local(videos_dir):
         videos_path.mkdir(parents=True, exist_ok=True)
         return songs
 
-    for folder in sorted(videos_path.iterdir()):
-        if not folder.is_dir() or folder.name.startswith("_"):
-            continue
-
-        # Chercher vidéo
-        video_file = None
-        for f in folder.iterdir():
-            if f.suffix.lower() in VIDEO_EXTENSIONS:
-                video_file = f
-                break
+    with os.scandir(videos_path) as it:
+        folders = sorted(
+            (e for e in it if e.is_dir() and not e.name.startswith("_")),
+            key=lambda e: e.name,
+        )
 
-        # Chercher SRT
-        srt_file = None
-        for f in folder.iterdir():
-            if f.suffix.lower() == ".srt":
-                srt_file = f
-                break
+    for folder in folders:
+        # Un seul parcours du dossier : vidéo, SRT et config.json
+        video_file = srt_file = config_file = None
+        with os.scandir(folder.path) as it:
+            for entry in it:
+                name = entry.name
+                dot = name.rfind(".")
+                ext = name[dot:].lower() if dot > 0 else ""
+                if ext == ".srt":
+                    if srt_file is None:
+                        srt_file = entry
+                elif ext in VIDEO_EXTENSIONS:
+                    if video_file is None:
+                        video_file = entry
+                elif name == "config.json":
+                    config_file = entry
 
         if not srt_file:
             continue
 
         # Config
         config = {}
-        config_file = folder / "config.json"
-        if config_file.exists():
-            try:
-                with open(config_file, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-            except Exception:
-                pass
+        if config_file:
+            config = load_cached(config_file.path, config_file.stat().st_mtime_ns,
+                                 _config_cache, load_config_file)
 
-        lyrics = parse_srt_file(srt_file)
+        lyrics = load_cached(srt_file.path, srt_file.stat().st_mtime_ns,
+                             _srt_cache, parse_srt_file)
         if not lyrics:
             continue
 
@@ -258,65 +369,80 @@ def scan_library_local(videos_dir):
     return songs
 
 
-def scan_library_r2():
-    """Scanne le bucket R2."""
-    songs = []
-    folders = r2_list_folders()
+def scan_folder_r2(folder, files):
+    """Charge une chanson depuis un dossier R2, None si elle n'a pas de sous-titres.
 
-    for folder in folders:
-        # Chercher SRT
-        srt_content = r2_get_text(f"{folder}/subtitles.srt")
-        if not srt_content:
-            print(f"  ⏭  {folder}/ → pas de subtitles.srt")
-            continue
+    files est le contenu du dossier tel que listé par r2_list_library().
+    """
+    # Chercher SRT
+    if "subtitles.srt" not in files:
+        return None
+    lyrics = r2_get_parsed(f"{folder}/subtitles.srt", parse_srt, files["subtitles.srt"])
+    if not lyrics:
+        return None
 
-        lyrics = parse_srt(srt_content)
-        if not lyrics:
-            continue
+    # Config
+    config = {}
+    if "config.json" in files:
+        config = r2_get_parsed(f"{folder}/config.json", parse_config, files["config.json"]) or {}
 
-        # Config
-        config = {}
-        config_text = r2_get_text(f"{folder}/config.json")
-        if config_text:
-            try:
-                config = json.loads(config_text)
-            except Exception:
-                pass
+    # Chercher vidéo
+    video_key = next(
+        (f"{folder}/{name}" for name in files
+         if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS),
+        None,
+    )
+    has_video = video_key is not None
+    video_url = None
+    if has_video and R2_PUBLIC_URL:
+        video_url = f"{R2_PUBLIC_URL.rstrip('/')}/{video_key}"
+
+    duration = max(c["end"] for c in lyrics)
+    default_title = folder.replace("-", " ").replace("_", " ").title()
+
+    # Support cutoff_windows (nouveau) ou cutoff_time (ancien format)
+    cutoff_windows = config.get("cutoff_windows", None)
+    if not cutoff_windows:
+        ct = config.get("cutoff_time", round(duration * 0.5, 1))
+        cutoff_windows = [[ct, duration]]
+
+    song = {
+        "id": folder,
+        "title": config.get("title", default_title),
+        "artist": config.get("artist", "Artiste inconnu"),
+        "difficulty": config.get("difficulty", "medium"),
+        "tags": config.get("tags", []),
+        "cutoff_windows": cutoff_windows,
+        "subtitle_offset": config.get("subtitle_offset", 0),
+        "duration": duration,
+        "has_video": has_video,
+        "video_url": video_url,
+        "lyrics": lyrics,
+        "folder": folder,
+    }
+    return song
 
-        # Chercher vidéo
-        video_key = r2_find_video(folder)
-        has_video = video_key is not None
-        video_url = None
-        if has_video and R2_PUBLIC_URL:
-            video_url = f"{R2_PUBLIC_URL.rstrip('/')}/{video_key}"
 
-        duration = max(c["end"] for c in lyrics)
-        default_title = folder.replace("-", " ").replace("_", " ").title()
+def scan_library_r2():
+    """Scanne le bucket R2."""
+    songs = []
+    library = r2_list_library()
+    folders = list(library)
 
-        # Support cutoff_windows (nouveau) ou cutoff_time (ancien format)
-        cutoff_windows = config.get("cutoff_windows", None)
-        if not cutoff_windows:
-            ct = config.get("cutoff_time", round(duration * 0.5, 1))
-            cutoff_windows = [[ct, duration]]
+    # Un seul LIST pour tout le bucket ; restent les GET des SRT/config
+    # modifiés, faits en parallèle (map conserve l'ordre des dossiers)
+    with ThreadPoolExecutor(max_workers=R2_SCAN_WORKERS) as pool:
+        results = list(pool.map(scan_folder_r2, folders, library.values()))
+
+    for folder, song in zip(folders, results):
+        if not song:
+            print(f"  ⏭  {folder}/ → pas de subtitles.srt valide")
+            continue
 
-        song = {
-            "id": folder,
-            "title": config.get("title", default_title),
-            "artist": config.get("artist", "Artiste inconnu"),
-            "difficulty": config.get("difficulty", "medium"),
-            "tags": config.get("tags", []),
-            "cutoff_windows": cutoff_windows,
-            "subtitle_offset": config.get("subtitle_offset", 0),
-            "duration": duration,
-            "has_video": has_video,
-            "video_url": video_url,
-            "lyrics": lyrics,
-            "folder": folder,
-        }
         songs.append(song)
-        windows_str = ", ".join(f"{float(w[0]):.0f}s→{float(w[1]):.0f}s" for w in cutoff_windows)
-        status = "🎬" if has_video else "🎵"
-        print(f"  {status} {song['title']} — {song['artist']} ({len(lyrics)} cues, coupures: {windows_str})")
+        windows_str = ", ".join(f"{float(w[0]):.0f}s→{float(w[1]):.0f}s" for w in song["cutoff_windows"])
+        status = "🎬" if song["has_video"] else "🎵"
+        print(f"  {status} {song['title']} — {song['artist']} ({len(song['lyrics'])} cues, coupures: {windows_str})")
 
     return songs
 
@@ -337,17 +463,28 @@ def scan_library():
 # ============================================================
 game_rooms = {}   # { room_id: { state: {...}, last_activity: timestamp } }
 rooms_lock = threading.Lock()
+rooms_changed = threading.Condition(rooms_lock)  # notified on every state update
 
 ROOM_EXPIRY_SECONDS = 2 * 3600  # 2 hours
+LONG_POLL_SECONDS = 25
 
 
-def get_room_state(room_id):
-    """Get state for a room, or empty state if not found."""
-    with rooms_lock:
+def get_room_state_json(room_id, since=None):
+    """Get serialized state for a room, or empty state if not found.
+
+    If since is given, wait (up to LONG_POLL_SECONDS) for a state newer
+    than that timestamp before answering.
+    """
+    with rooms_changed:
+        if since is not None:
+            rooms_changed.wait_for(
+                lambda: game_rooms.get(room_id, {}).get("state", {}).get("timestamp", 0) > since,
+                timeout=LONG_POLL_SECONDS,
+            )
         room = game_rooms.get(room_id)
         if room:
-            return dict(room["state"])
-        return {"song_id": None, "room_id": room_id}
+            return room["state_json"]
+    return dump_json({"song_id": None, "room_id": room_id})
 
 
 def update_room_state(room_id, data):
@@ -359,6 +496,9 @@ def update_room_state(room_id, data):
         game_rooms[room_id]["state"]["room_id"] = room_id
         game_rooms[room_id]["state"]["timestamp"] = time.time()
         game_rooms[room_id]["last_activity"] = time.time()
+        # Sérialisé une fois par mise à jour plutôt qu'à chaque poll de l'overlay
+        game_rooms[room_id]["state_json"] = dump_json(game_rooms[room_id]["state"])
+        rooms_changed.notify_all()
 
 
 def check_room_exists(room_id):
@@ -393,10 +533,24 @@ def list_active_rooms():
 
 
 songs_cache = []
+songs_cache_stripped = []       # songs_cache sans les paroles
+songs_list_json = b'{"songs": []}'  # réponse de /api/songs, sérialisée au refresh
+songs_list_gz = None            # même réponse, compressée en gzip
+songs_list_etag = None
+songs_json_by_id = {}           # { song_id: réponse de /api/songs/<id> }
 songs_lock = threading.Lock()
 
 
 class GameHandler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive : le navigateur réutilise la connexion entre deux polls.
+    # Chaque réponse doit donc avoir un Content-Length exact.
+    protocol_version = "HTTP/1.1"
+    # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, Nagle
+    # retarderait chaque réponse d'un poll keep-alive de ~40 ms
+    disable_nagle_algorithm = True
+    # Une connexion keep-alive inactive occupe un thread : fermée après 60 s
+    # sans nouvelle requête (doit rester > LONG_POLL_SECONDS)
+    timeout = 60
 
     def log_message(self, format, *args):
         msg = format % args
@@ -410,32 +564,42 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         # --- API ---
         if path == "/api/songs":
             with songs_lock:
-                data = [strip_lyrics(s) for s in songs_cache]
-            self.send_json({"songs": data})
+                body, gz, etag = songs_list_json, songs_list_gz, songs_list_etag
+            self.send_json_bytes(body, etag=etag, gz=gz)
             return
 
         if path.startswith("/api/songs/"):
             song_id = urllib.parse.unquote(path.split("/api/songs/", 1)[1])
             with songs_lock:
-                song = next((s for s in songs_cache if s["id"] == song_id), None)
-            if song:
-                self.send_json(song)
+                body = songs_json_by_id.get(song_id)
+            if body:
+                self.send_json_bytes(body)
             else:
                 self.send_json({"error": "Not found"}, 404)
             return
 
         if path == "/api/random":
             with songs_lock:
-                if songs_cache:
-                    self.send_json(random.choice(songs_cache))
-                else:
-                    self.send_json({"error": "No songs"}, 404)
+                body = songs_json_by_id[random.choice(songs_cache)["id"]] if songs_cache else None
+            if body:
+                self.send_json_bytes(body)
+            else:
+                self.send_json({"error": "No songs"}, 404)
             return
 
         if path == "/api/refresh":
-            refresh_songs()
+            # Le scan tourne dans un thread à part, partagé par les refresh
+            # simultanés. ?async=1 répond tout de suite avec la liste actuelle.
+            params = urllib.parse.parse_qs(parsed.query)
+            done = request_refresh(force=params.get("force", [""])[0] == "1")
+            if params.get("async", [""])[0] == "1":
+                with songs_lock:
+                    data = songs_cache_stripped
+                self.send_json({"songs": data, "message": "Scan en cours"}, 202)
+                return
+            done.wait()
             with songs_lock:
-                data = [strip_lyrics(s) for s in songs_cache]
+                data = songs_cache_stripped
             self.send_json({"songs": data, "message": "OK"})
             return
 
@@ -445,8 +609,13 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
             room_id = params.get("room", [""])[0].strip()
             if not room_id:
                 self.send_json({"error": "Missing room parameter"}, 400)
-            else:
-                self.send_json(get_room_state(room_id))
+                return
+            # ?since=<timestamp> : long polling, attend une mise à jour plus récente
+            try:
+                since = float(params["since"][0]) if "since" in params else None
+            except ValueError:
+                since = None
+            self.send_json_bytes(get_room_state_json(room_id, since))
             return
 
         # --- List active rooms ---
@@ -494,6 +663,7 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", 0)
         self.end_headers()
 
     def do_POST(self):
@@ -502,6 +672,19 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
 
         # --- Game state update (regie pushes this) ---
         if path == "/api/state":
+            # Le corps est lu avant toute validation : en keep-alive, un corps
+            # non lu serait pris pour le début de la requête suivante
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # Impossible de savoir où finit le corps : on ferme la connexion
+                self.close_connection = True
+                self.send_json({"error": "Invalid Content-Length"}, 400)
+                return
+            body = self.rfile.read(length)
+
             try:
                 params = urllib.parse.parse_qs(parsed.query)
                 room_id = params.get("room", [""])[0].strip()
@@ -509,8 +692,6 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
                     self.send_json({"error": "Missing room parameter"}, 400)
                     return
 
-                length = int(self.headers.get("Content-Length", 0))
-                body = self.rfile.read(length)
                 data = json.loads(body.decode("utf-8"))
 
                 update_room_state(room_id, data)
@@ -522,10 +703,39 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         self.send_error(404)
 
     def send_json(self, data, code=200):
-        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_json_bytes(dump_json(data), code)
+
+    def send_json_bytes(self, body, code=200, etag=None, gz=None):
+        """Envoie une réponse JSON déjà sérialisée.
+
+        gz est la même réponse pré-compressée, envoyée si le client accepte
+        gzip. Répond 304 si l'ETag du client correspond.
+        """
+        use_gz = gz is not None and accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        if use_gz:
+            body = gz
+            if etag:
+                # Représentation différente → ETag différent
+                etag = etag[:-1] + '-gz"'
+
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            if gz is not None:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+
         self.send_response(code)
         self.send_header("Content-Type", "application/json; charset=utf-8")
         self.send_header("Content-Length", len(body))
+        if use_gz:
+            self.send_header("Content-Encoding", "gzip")
+        if gz is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if etag:
+            self.send_header("ETag", etag)
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
         self.wfile.write(body)
@@ -540,41 +750,56 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         relative = clean[len("videos/"):]
         filepath = os.path.join(VIDEOS_DIR, relative)
 
-        if not os.path.isfile(filepath):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
             self.send_error(404)
             return
 
-        file_size = os.path.getsize(filepath)
-        mime_type = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+        file_size = st.st_size
+        ext = os.path.splitext(filepath)[1].lower()
+        mime_type = MIME_TYPES.get(ext)
+        if mime_type is None:
+            mime_type = mimetypes.guess_type("file" + ext)[0] or "application/octet-stream"
+            MIME_TYPES[ext] = mime_type
 
         # Range request support
         range_header = self.headers.get("Range")
-        if range_header:
-            match = re.match(r"bytes=(\d+)-(\d*)", range_header)
+        start = None
+        if range_header is None:
+            pass  # cas courant : fichier complet, rien à parser
+        elif range_header == "bytes=0-":
+            # Premier chargement d'une vidéo par le navigateur : pas de regex
+            start, end = 0, file_size - 1
+        else:
+            match = RANGE_RE.match(range_header)
             if match:
                 start = int(match.group(1))
                 end = int(match.group(2)) if match.group(2) else file_size - 1
                 end = min(end, file_size - 1)
-                length = end - start + 1
 
-                self.send_response(206)
-                self.send_header("Content-Type", mime_type)
-                self.send_header("Content-Length", length)
-                self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
-                self.send_header("Accept-Ranges", "bytes")
+        if start is not None:
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{file_size}")
+                self.send_header("Content-Length", 0)
                 self.end_headers()
-
-                with open(filepath, "rb") as f:
-                    f.seek(start)
-                    remaining = length
-                    while remaining > 0:
-                        chunk = f.read(min(65536, remaining))
-                        if not chunk:
-                            break
-                        self.wfile.write(chunk)
-                        remaining -= len(chunk)
                 return
 
+            length = end - start + 1
+            self.send_response(206)
+            self.send_header("Content-Type", mime_type)
+            self.send_header("Content-Length", length)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+
+            with open(filepath, "rb") as f:
+                self.send_file_range(f, start, length)
+            return
+
         self.send_response(200)
         self.send_header("Content-Type", mime_type)
         self.send_header("Content-Length", file_size)
@@ -582,18 +807,44 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
 
         with open(filepath, "rb") as f:
-            while True:
-                chunk = f.read(65536)
-                if not chunk:
-                    break
-                self.wfile.write(chunk)
+            self.send_file_range(f, 0, file_size)
+
+    def send_file_range(self, f, start, length):
+        """Envoie length octets de f à partir de start.
+
+        socket.sendfile utilise sendfile(2) (copie noyau, sans passer par
+        Python) en respectant le timeout de la socket (la socket est alors
+        non bloquante : un os.sendfile direct échouerait sur EAGAIN).
+        """
+        if length <= 0:
+            # Fichier vide : socket.sendfile refuse count=0
+            return
+        if hasattr(os, "sendfile"):
+            sent = self.connection.sendfile(f, start, length)
+            if sent < length:
+                # Fichier tronqué : Content-Length faux, on coupe la connexion
+                self.close_connection = True
+            return
+
+        # Sans sendfile (Windows) : socket.sendfile lirait par blocs de 8 Ko
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                self.close_connection = True
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
 
     def serve_frontend(self, filename="index.html"):
         frontend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
         if not os.path.isfile(frontend_path):
+            body = f"{filename} not found".encode()
             self.send_response(404)
+            self.send_header("Content-Length", len(body))
             self.end_headers()
-            self.wfile.write(f"{filename} not found".encode())
+            self.wfile.write(body)
             return
 
         with open(frontend_path, "r", encoding="utf-8") as f:
@@ -606,19 +857,115 @@ class GameHandler(http.server.BaseHTTPRequestHandler):
         self.wfile.write(body)
 
 
+def accepts_gzip(accept_encoding):
+    """True si l'en-tête Accept-Encoding autorise gzip (q > 0).
+
+    gzip explicite l'emporte sur le joker "*" ; "gzip;q=0" le refuse.
+    """
+    gzip_q = None
+    wildcard = False
+    for token in accept_encoding.split(","):
+        coding, _, params = token.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            gzip_q = max(q, gzip_q or 0.0)
+        elif coding == "*":
+            wildcard = q > 0
+    if gzip_q is not None:
+        return gzip_q > 0
+    return wildcard
+
+
 def strip_lyrics(song):
     return {k: v for k, v in song.items() if k != "lyrics"}
 
 
-def refresh_songs():
-    global songs_cache
+def dump_json(data):
+    """Sérialise data en JSON UTF-8 (bytes), avec orjson s'il est installé."""
+    if orjson:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson refuse certaines valeurs (entiers > 64 bits...) : repli stdlib
+            pass
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def refresh_songs(force=False):
+    global songs_cache, songs_cache_stripped, songs_list_json, songs_list_gz, songs_list_etag
+    global songs_json_by_id
+    if force:
+        clear_scan_caches()
     print("📚 Scan de la bibliothèque...")
     new_songs = scan_library()
+
+    # Les réponses de /api/songs et /api/songs/<id> ne changent qu'ici :
+    # on les sérialise une fois plutôt qu'à chaque requête
+    stripped = [strip_lyrics(s) for s in new_songs]
+    list_json = dump_json({"songs": stripped})
+    list_gz = gzip.compress(list_json, compresslevel=6)
+    list_etag = f'"{hashlib.md5(list_json).hexdigest()}"'
+    json_by_id = {s["id"]: dump_json(s) for s in new_songs}
+
     with songs_lock:
         songs_cache = new_songs
+        songs_cache_stripped = stripped
+        songs_list_json = list_json
+        songs_list_gz = list_gz
+        songs_list_etag = list_etag
+        songs_json_by_id = json_by_id
     print(f"  ✅ {len(new_songs)} chanson(s)")
 
 
+refresh_lock = threading.Lock()
+refresh_done = None    # Event du scan en arrière-plan en cours, None si aucun
+refresh_forced = None  # Event d'un scan forcé demandé pendant le scan en cours
+
+
+def request_refresh(force=False):
+    """Lance un scan en arrière-plan, ou rejoint celui déjà en cours.
+
+    Un scan forcé demandé pendant un scan en cours est mis en file : il
+    vide les caches et relance un scan dès que le premier se termine (les
+    demandes forcées simultanées partagent ce second scan).
+    Retourne un threading.Event positionné à la fin du scan concerné.
+    """
+    global refresh_done, refresh_forced
+    with refresh_lock:
+        if refresh_done is None:
+            refresh_done = threading.Event()
+            threading.Thread(target=_run_refresh, args=(refresh_done, force), daemon=True).start()
+            return refresh_done
+        if force:
+            if refresh_forced is None:
+                refresh_forced = threading.Event()
+            return refresh_forced
+        return refresh_done
+
+
+def _run_refresh(done, force):
+    global refresh_done, refresh_forced
+    while done is not None:
+        try:
+            refresh_songs(force=force)
+        except Exception as e:
+            print(f"  ❌ Erreur pendant le scan : {e}")
+        with refresh_lock:
+            # Enchaîne sur le scan forcé en attente, s'il y en a un
+            finished, done, force = done, refresh_forced, True
+            refresh_done = done
+            refresh_forced = None
+        finished.set()
+
+
 # ============================================================
 # MAIN
 # ============================================================
@@ -651,7 +998,8 @@ def main():
             print(f"  💡 Ajoutez des sous-dossiers dans {VIDEOS_DIR}/")
         print()
 
-    server = http.server.HTTPServer(("0.0.0.0", PORT), GameHandler)
+    # Un thread par connexion : un flux vidéo ne bloque plus les polls de l'overlay
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", PORT), GameHandler)
     print(f"  🚀 Serveur lancé sur http://localhost:{PORT}")
     print("  🛑 Ctrl+C pour arrêter")
     print()
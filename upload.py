@@ -15,17 +15,30 @@ Usage :
   python upload.py add videos/ma-chanson/        Upload un dossier chanson
   python upload.py add videos/ma-chanson/ --id mon-titre   Upload avec ID custom
   python upload.py list                          Liste les chansons sur R2
+  python upload.py list ma-chanson               Détail d'une ou plusieurs chansons
+  python upload.py list --short                  Noms des chansons seulement (rapide)
   python upload.py delete ma-chanson             Supprime une chanson
   python upload.py sync videos/                  Upload toutes les chansons d'un dossier
+  python upload.py sync videos/ --force          Réupload même les fichiers déjà à jour
+
+Barre de progression pendant les uploads si tqdm est installé (pip install tqdm).
 """
 
 import argparse
+import functools
+import hashlib
 import json
-import mimetypes
 import os
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    from tqdm import tqdm  # optionnel : barre de progression des uploads
+except ImportError:
+    tqdm = None
+
 # ============================================================
 # CONFIG — charge depuis .env si présent
 # ============================================================
@@ -49,8 +62,52 @@ R2_ACCESS_KEY_ID = os.environ.get("R2_ACCESS_KEY_ID", "")
 R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY", "")
 R2_PUBLIC_URL = os.environ.get("R2_PUBLIC_URL", "")
 
-VIDEO_EXTENSIONS = {".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg"}
-UPLOAD_EXTENSIONS = VIDEO_EXTENSIONS | {".srt", ".json", ".txt", ".vtt"}
+VIDEO_EXTENSIONS = frozenset({".mp4", ".webm", ".mkv", ".avi", ".mov", ".m4v", ".ogg"})
+UPLOAD_EXTENSIONS = VIDEO_EXTENSIONS | frozenset({".srt", ".json", ".txt", ".vtt"})
+
+# Content-Type envoyé à R2 (les vidéos sont lues directement par le navigateur),
+# fixe plutôt que dépendant du mime.types de la machine
+MIME_BY_EXT = {
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".webm": "video/webm",
+    ".mkv": "video/x-matroska",
+    ".avi": "video/x-msvideo",
+    ".mov": "video/quicktime",
+    ".ogg": "video/ogg",
+    ".srt": "application/x-subrip",
+    ".vtt": "text/vtt",
+    ".json": "application/json",
+    ".txt": "text/plain",
+}
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+# Uploads simultanés (le client boto3 est partagé entre les threads) :
+# par chanson pour add, toutes chansons confondues pour sync
+UPLOAD_WORKERS = 8
+SYNC_WORKERS = 16
+
+# Au-delà de 8 Mo, un fichier est envoyé en multipart : parts de 16 Mo,
+# jusqu'à 10 envoyées en parallèle
+MULTIPART_THRESHOLD = 8 * MB
+MULTIPART_CHUNKSIZE = 16 * MB
+MULTIPART_CONCURRENCY = 10
+
+# Chaque upload_file a ses propres threads de parts : au pire, tous les
+# workers envoient une grosse vidéo en même temps
+MAX_POOL_CONNECTIONS = max(UPLOAD_WORKERS, SYNC_WORKERS) * MULTIPART_CONCURRENCY
+
+# Taille des écritures sur la socket pendant les PUT : 8 Ko par défaut
+# (http.client), soit un appel système et un aller-retour du GIL tous les
+# 8 Ko. Avec 1 Mo, les threads d'upload écrivent par gros blocs.
+SEND_BUFFER_SIZE = 1 * MB
+
+# delete_objects accepte au plus 1000 clés par requête
+DELETE_BATCH_SIZE = 1000
+DELETE_WORKERS = 4
 
 
 def check_config():
@@ -74,7 +131,28 @@ def check_config():
         sys.exit(1)
 
 
+def raise_send_buffer():
+    """Passe le blocksize par défaut des connexions HTTP à SEND_BUFFER_SIZE."""
+    from http.client import HTTPConnection
+    HTTPConnection.__init__.__defaults__ = tuple(
+        SEND_BUFFER_SIZE if x == 8192 else x for x in HTTPConnection.__init__.__defaults__
+    )
+    # urllib3 2.x (utilisé par botocore) a son propre défaut, en argument nommé
+    try:
+        from urllib3.connection import HTTPConnection as Urllib3Connection
+    except ImportError:
+        return
+    kwdefaults = Urllib3Connection.__init__.__kwdefaults__
+    if kwdefaults and "blocksize" in kwdefaults:
+        kwdefaults["blocksize"] = SEND_BUFFER_SIZE
+
+
+raise_send_buffer()
+
+
+@functools.lru_cache(maxsize=1)
 def get_s3_client():
+    """Client S3 unique pour tout le processus (thread-safe, pool partagé)."""
     try:
         import boto3
         from botocore.config import Config
@@ -87,7 +165,14 @@ def get_s3_client():
         endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
         aws_access_key_id=R2_ACCESS_KEY_ID,
         aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version="s3v4"),
+        # Pool assez grand pour les uploads parallèles (sinon urllib3 jette
+        # les connexions en trop et refait une poignée de main TLS à chaque fois)
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+            tcp_keepalive=True,
+        ),
         region_name="auto",
     )
 
@@ -103,9 +188,10 @@ def cmd_add(args):
         print(f"❌ '{folder}' n'est pas un dossier")
         sys.exit(1)
 
+    has_srt, files = scan_song_folder(folder)
+
     # Vérifier qu'il y a au moins un SRT
-    srt_files = [f for f in folder.iterdir() if f.suffix.lower() == ".srt"]
-    if not srt_files:
+    if not has_srt:
         print(f"❌ Aucun fichier .srt trouvé dans '{folder}'")
         print("   Générez-en un avec : python generate_subtitles.py " + str(folder))
         sys.exit(1)
@@ -116,9 +202,6 @@ def cmd_add(args):
 
     s3 = get_s3_client()
 
-    # Lister les fichiers à uploader
-    files = [f for f in folder.iterdir() if f.is_file() and f.suffix.lower() in UPLOAD_EXTENSIONS]
-
     if not files:
         print(f"❌ Aucun fichier uploadable trouvé dans '{folder}'")
         sys.exit(1)
@@ -126,29 +209,33 @@ def cmd_add(args):
     print(f"📤 Upload de '{song_id}' vers R2...")
     print()
 
-    for filepath in files:
-        key = f"{song_id}/{filepath.name}"
-        content_type = mimetypes.guess_type(str(filepath))[0] or "application/octet-stream"
-        file_size = filepath.stat().st_size
-        size_str = format_size(file_size)
-
-        print(f"  ⬆️  {filepath.name} ({size_str})...", end=" ", flush=True)
-
-        with open(filepath, "rb") as f:
-            s3.upload_fileobj(
-                f,
-                R2_BUCKET_NAME,
-                key,
-                ExtraArgs={"ContentType": content_type},
-            )
-
-        print("✅")
+    failed = []
+    pbar = progress_bar(sum(f.stat().st_size for f in files))
+    log = pbar.write if pbar else print
+    progress = pbar.update if pbar else None
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        futures = {pool.submit(upload_one, s3, filepath, song_id, progress): filepath for filepath in files}
+        for future in as_completed(futures):
+            filepath = futures[future]
+            error = future.result()
+            size_str = format_size(filepath.stat().st_size)
+            if error:
+                log(f"  ❌ {filepath.name} ({size_str}) : {error}")
+                failed.append(filepath.name)
+            else:
+                log(f"  ✅ {filepath.name} ({size_str})")
+    if pbar:
+        pbar.close()
 
     print()
+    if failed:
+        print(f"❌ {len(failed)} fichier(s) non uploadé(s) : {', '.join(failed)}")
+        sys.exit(1)
+
     print(f"✨ '{song_id}' uploadé avec succès !")
 
     if R2_PUBLIC_URL:
-        video_files = [f for f in files if f.suffix.lower() in VIDEO_EXTENSIONS]
+        video_files = [f for f in files if file_ext(f.name) in VIDEO_EXTENSIONS]
         if video_files:
             url = f"{R2_PUBLIC_URL.rstrip('/')}/{song_id}/{video_files[0].name}"
             print(f"🔗 URL vidéo : {url}")
@@ -162,42 +249,68 @@ def cmd_list(args):
 
     print("📚 Chansons sur R2 :\n")
 
-    folders = {}
+    if args.short:
+        song_ids = list_song_ids(s3)
+        if not song_ids:
+            print("  (vide)")
+            return
+        out = [f"  {song_id}/" for song_id in song_ids]
+        out.append("")
+        out.append(f"  Total : {len(song_ids)} chanson(s)")
+        sys.stdout.write("\n".join(out) + "\n")
+        return
+
+    # Tout le bucket, ou seulement les dossiers demandés
+    prefixes = [f"{song_id}/" for song_id in args.song_ids] or [""]
+
+    folders = defaultdict(lambda: {"files": [], "total_size": 0})
     paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=R2_BUCKET_NAME):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            parts = key.split("/", 1)
-            if len(parts) == 2:
-                folder = parts[0]
-                filename = parts[1]
-                if folder not in folders:
-                    folders[folder] = {"files": [], "total_size": 0}
-                folders[folder]["files"].append(filename)
-                folders[folder]["total_size"] += obj["Size"]
+    for prefix in prefixes:
+        # 1000 clés par page : le maximum accepté par S3/R2
+        pages = paginator.paginate(Bucket=R2_BUCKET_NAME, Prefix=prefix,
+                                   PaginationConfig={"PageSize": 1000})
+        for page in pages:
+            for obj in page.get("Contents") or ():
+                folder, _, filename = obj["Key"].partition("/")
+                # Ignore les clés hors dossier et les marqueurs "dossier/"
+                if not filename:
+                    continue
+                entry = folders[folder]
+                entry["files"].append(filename)
+                entry["total_size"] += obj["Size"]
 
     if not folders:
         print("  (vide)")
         return
 
+    # Sortie construite en mémoire puis écrite d'un coup (un print par ligne
+    # coûte cher sur un bucket de plusieurs milliers de chansons)
+    out = []
     for folder in sorted(folders):
         info = folders[folder]
         files = info["files"]
         size = format_size(info["total_size"])
-        has_video = any(os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS for f in files)
-        has_srt = any(f.endswith(".srt") for f in files)
-        has_config = any(f == "config.json" for f in files)
+        # Une seule passe sur les fichiers pour les trois indicateurs
+        has_video = has_srt = has_config = False
+        for f in files:
+            if f.endswith(".srt"):
+                has_srt = True
+            elif f == "config.json":
+                has_config = True
+            elif not has_video and file_ext(f) in VIDEO_EXTENSIONS:
+                has_video = True
 
         status = "🎬" if has_video else "🎵"
         srt_status = "✅" if has_srt else "❌"
         config_status = "✅" if has_config else "➖"
 
-        print(f"  {status} {folder}/")
-        print(f"     Fichiers: {', '.join(files)}")
-        print(f"     Taille: {size} | SRT: {srt_status} | Config: {config_status}")
-        print()
+        out.append(f"  {status} {folder}/")
+        out.append(f"     Fichiers: {', '.join(files)}")
+        out.append(f"     Taille: {size} | SRT: {srt_status} | Config: {config_status}")
+        out.append("")
 
-    print(f"  Total : {len(folders)} chanson(s)")
+    out.append(f"  Total : {len(folders)} chanson(s)")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def cmd_delete(args):
@@ -224,7 +337,22 @@ def cmd_delete(args):
         print("   Annulé.")
         return
 
-    s3.delete_objects(Bucket=R2_BUCKET_NAME, Delete={"Objects": objects})
+    batches = [objects[i:i + DELETE_BATCH_SIZE]
+               for i in range(0, len(objects), DELETE_BATCH_SIZE)]
+
+    # Quiet : R2 ne renvoie que les clés en erreur
+    def delete_batch(batch):
+        resp = s3.delete_objects(Bucket=R2_BUCKET_NAME, Delete={"Objects": batch, "Quiet": True})
+        return resp.get("Errors", [])
+
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as pool:
+        errors = [err for errs in pool.map(delete_batch, batches) for err in errs]
+
+    if errors:
+        for err in errors:
+            print(f"   ❌ {err.get('Key')} : {err.get('Message') or err.get('Code')}")
+        print(f"❌ '{song_id}' : {len(errors)} fichier(s) non supprimé(s)")
+        sys.exit(1)
     print(f"✅ '{song_id}' supprimé.")
 
 
@@ -244,27 +372,73 @@ def cmd_sync(args):
 
     print(f"📤 Sync de {len(folders)} dossier(s)...\n")
 
-    s3 = get_s3_client()
-
+    songs = []
     for folder in folders:
-        srt_files = [f for f in folder.iterdir() if f.suffix.lower() == ".srt"]
-        if not srt_files:
+        has_srt, files = scan_song_folder(folder)
+        if not has_srt:
             print(f"  ⏭  {folder.name}/ — pas de .srt, ignoré")
             continue
-
         song_id = folder.name.lower().replace(" ", "-")
-        files = [f for f in folder.iterdir() if f.is_file() and f.suffix.lower() in UPLOAD_EXTENSIONS]
-
-        print(f"  📤 {song_id}/ ({len(files)} fichiers)...", end=" ", flush=True)
-
-        for filepath in files:
-            key = f"{song_id}/{filepath.name}"
-            content_type = mimetypes.guess_type(str(filepath))[0] or "application/octet-stream"
+        songs.append({"id": song_id, "files": files, "remote": {},
+                      "pending": len(files), "skipped": 0, "errors": []})
 
-            with open(filepath, "rb") as f:
-                s3.upload_fileobj(f, R2_BUCKET_NAME, key, ExtraArgs={"ContentType": content_type})
-
-        print("✅")
+    s3 = get_s3_client()
+    failed = []
+
+    # Un seul pool pour toutes les chansons : les fichiers de la chanson
+    # suivante partent pendant que les derniers de la précédente finissent
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        if not args.force:
+            listings = {pool.submit(list_remote_files, s3, song["id"]): song for song in songs}
+            for future in as_completed(listings):
+                song = listings[future]
+                try:
+                    song["remote"] = future.result()
+                except Exception as e:
+                    print(f"  ⚠️  {song['id']}/ — liste R2 indisponible ({e}), tout sera uploadé")
+
+        pbar = progress_bar(sum(f.stat().st_size for song in songs for f in song["files"]))
+        log = pbar.write if pbar else print
+        progress = pbar.update if pbar else None
+
+        futures = {
+            pool.submit(sync_one, s3, filepath, song["id"], song["remote"].get(filepath.name), progress):
+                (song, filepath)
+            for song in songs
+            for filepath in song["files"]
+        }
+        for future in as_completed(futures):
+            song, filepath = futures[future]
+            uploaded, error = future.result()
+            if error:
+                song["errors"].append((filepath.name, error))
+            elif not uploaded:
+                song["skipped"] += 1
+
+            song["pending"] -= 1
+            if song["pending"]:
+                continue
+
+            # Dernier fichier de la chanson : on affiche son bilan
+            song_id, count, skipped = song["id"], len(song["files"]), song["skipped"]
+            if song["errors"]:
+                log(f"  📤 {song_id}/ ({count} fichiers)... ❌")
+                for name, error in song["errors"]:
+                    log(f"     {name} : {error}")
+                    failed.append(f"{song_id}/{name}")
+            elif skipped == count:
+                log(f"  📤 {song_id}/ ({count} fichiers)... ✅ déjà à jour")
+            elif skipped:
+                log(f"  📤 {song_id}/ ({count} fichiers)... ✅ ({skipped} déjà à jour)")
+            else:
+                log(f"  📤 {song_id}/ ({count} fichiers)... ✅")
+
+        if pbar:
+            pbar.close()
+
+    if failed:
+        print(f"\n❌ {len(failed)} fichier(s) non uploadé(s)")
+        sys.exit(1)
 
     print(f"\n✨ Sync terminé !")
 
@@ -272,15 +446,162 @@ def cmd_sync(args):
 # ============================================================
 # HELPERS
 # ============================================================
+def scan_song_folder(folder):
+    """Parcourt le dossier chanson en une seule passe.
+
+    Retourne (contient un .srt, fichiers à uploader). Les fichiers sont des
+    os.DirEntry : is_file() ne coûte pas d'appel système et stat() est mis
+    en cache au premier appel.
+    """
+    has_srt = False
+    files = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            ext = file_ext(entry.name)
+            if ext == ".srt":
+                has_srt = True
+            if ext in UPLOAD_EXTENSIONS:
+                files.append(entry)
+    return has_srt, files
+
+
+def file_ext(name):
+    """Extension en minuscules avec le point (".mp4"), "" s'il n'y en a pas.
+
+    Plus léger que Path.suffix / os.path.splitext pour de simples noms de fichiers.
+    """
+    _, dot, ext = name.rpartition(".")
+    if not dot or "/" in ext:
+        return ""
+    return "." + ext.lower()
+
+
+def upload_one(s3, filepath, song_id, progress=None):
+    """Upload un fichier (Path ou os.DirEntry) dans song_id/ sur R2.
+
+    progress, si fourni, est appelé avec le nombre d'octets envoyés au fil
+    de l'upload (depuis les threads de s3transfer).
+    Retourne l'erreur, ou None si OK."""
+    key = f"{song_id}/{filepath.name}"
+    content_type = MIME_BY_EXT.get(file_ext(filepath.name), "application/octet-stream")
+    try:
+        # upload_file (par chemin) laisse s3transfer lire les parts en parallèle
+        s3.upload_file(
+            os.fspath(filepath),
+            R2_BUCKET_NAME,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=get_transfer_config(),
+            Callback=progress,
+        )
+    except Exception as e:
+        return e
+    return None
+
+
+def list_song_ids(s3):
+    """Noms des dossiers chansons du bucket, triés.
+
+    Avec Delimiter="/", R2 renvoie directement les préfixes de premier niveau
+    (CommonPrefixes) : une requête par tranche de 1000 chansons, au lieu de
+    lister tous les fichiers.
+    """
+    song_ids = []
+    paginator = s3.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=R2_BUCKET_NAME, Delimiter="/",
+                               PaginationConfig={"PageSize": 1000})
+    for page in pages:
+        for prefix in page.get("CommonPrefixes") or ():
+            song_ids.append(prefix["Prefix"].rstrip("/"))
+    return sorted(song_ids)
+
+
+def list_remote_files(s3, song_id):
+    """Fichiers déjà présents dans song_id/ sur R2, en un seul LIST.
+
+    Retourne { nom_fichier: objet } (objet = entrée Contents : Size, ETag, LastModified).
+    """
+    prefix = f"{song_id}/"
+    remote = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=R2_BUCKET_NAME, Prefix=prefix, PaginationConfig={"PageSize": 1000})
+    for page in pages:
+        for obj in page.get("Contents") or ():
+            remote[obj["Key"][len(prefix):]] = obj
+    return remote
+
+
+def sync_one(s3, filepath, song_id, remote_obj=None, progress=None):
+    """Upload le fichier sauf s'il est déjà à jour sur R2 (remote_obj = son
+    entrée dans list_remote_files, None s'il est absent).
+
+    Retourne (uploadé, erreur).
+    """
+    try:
+        if remote_obj is not None and is_up_to_date(filepath, remote_obj):
+            if progress:
+                progress(filepath.stat().st_size)
+            return False, None
+    except OSError as e:
+        # Fichier supprimé ou illisible pendant le sync
+        return False, e
+    return True, upload_one(s3, filepath, song_id, progress)
+
+
+def is_up_to_date(filepath, remote_obj):
+    """Compare le fichier local à l'objet R2 : même taille, et même MD5 pour
+    un objet envoyé en un seul PUT. L'ETag d'un objet multipart n'est pas un
+    MD5 : on vérifie alors que le fichier local n'est pas plus récent."""
+    st = filepath.stat()
+    if remote_obj["Size"] != st.st_size:
+        return False
+
+    etag = remote_obj.get("ETag", "").strip('"')
+    if "-" in etag:
+        last_modified = remote_obj.get("LastModified")
+        return last_modified is None or st.st_mtime <= last_modified.timestamp()
+    return etag == file_md5(filepath)
+
+
+def file_md5(filepath):
+    md5 = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def get_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=MULTIPART_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def progress_bar(total_bytes):
+    """Barre de progression en octets si tqdm est installé et que la sortie est
+    un terminal, sinon None (les bilans restent affichés avec print)."""
+    if tqdm is None or not sys.stderr.isatty():
+        return None
+    return tqdm(total=total_bytes, unit="B", unit_scale=True, unit_divisor=1024, leave=False)
+
+
 def format_size(size_bytes):
-    if size_bytes < 1024:
+    if size_bytes < KB:
         return f"{size_bytes} B"
-    elif size_bytes < 1024 ** 2:
-        return f"{size_bytes / 1024:.1f} KB"
-    elif size_bytes < 1024 ** 3:
-        return f"{size_bytes / 1024**2:.1f} MB"
+    elif size_bytes < MB:
+        return f"{size_bytes / KB:.1f} KB"
+    elif size_bytes < GB:
+        return f"{size_bytes / MB:.1f} MB"
     else:
-        return f"{size_bytes / 1024**3:.1f} GB"
+        return f"{size_bytes / GB:.1f} GB"
 
 
 # ============================================================
@@ -299,7 +620,11 @@ def main():
     p_add.add_argument("--id", help="ID custom (défaut: nom du dossier)")
 
     # list
-    sub.add_parser("list", help="Liste les chansons sur R2")
+    p_list = sub.add_parser("list", help="Liste les chansons sur R2")
+    p_list.add_argument("song_ids", nargs="*", metavar="song_id",
+                        help="Chanson(s) à détailler (défaut: toutes)")
+    p_list.add_argument("--short", action="store_true",
+                        help="Noms des chansons seulement, sans lister leurs fichiers")
 
     # delete
     p_del = sub.add_parser("delete", help="Supprime une chanson")
@@ -308,6 +633,8 @@ def main():
     # sync
     p_sync = sub.add_parser("sync", help="Upload toutes les chansons d'un dossier")
     p_sync.add_argument("path", help="Dossier contenant les sous-dossiers chansons")
+    p_sync.add_argument("--force", action="store_true",
+                        help="Réupload tous les fichiers, même ceux déjà à jour sur R2")
 
     args = parser.parse_args()
 